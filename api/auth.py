@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from pydantic import BaseModel, EmailStr
+from sqlalchemy import func, select
+from pydantic import BaseModel, ConfigDict, EmailStr
 from typing import Optional
+from uuid import UUID
+import asyncio
 
-from core.database import get_db
+from core.database import get_db, get_db_ro
 from core.security import create_access_token, create_refresh_token, get_password_hash
 from services.auth import authenticate_user
 from models import User
@@ -27,21 +29,22 @@ class Token(BaseModel):
 
 
 class UserResponse(BaseModel):
-    id: str
+    id: UUID
     email: str
     username: str
     full_name: Optional[str]
     is_active: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 @router.post("/register", response_model=UserResponse)
 async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     # Check if user exists
     result = await db.execute(
-        select(User).where((User.email == user_data.email) | (User.username == user_data.username))
+        select(User).where(
+            (func.lower(User.email) == user_data.email.lower()) | (User.username == user_data.username)
+        )
     )
     if result.scalar_one_or_none():
         raise HTTPException(
@@ -49,32 +52,30 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
             detail="Email or username already registered"
         )
     
+    # Hash off the event loop; password hashing is CPU-bound
+    hashed_password = await asyncio.get_running_loop().run_in_executor(
+        None, get_password_hash, user_data.password
+    )
+    
     # Create new user
     user = User(
         email=user_data.email,
         username=user_data.username,
         full_name=user_data.full_name,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=hashed_password,
         is_active=True
     )
     
     db.add(user)
     await db.commit()
-    await db.refresh(user)
     
-    return UserResponse(
-        id=str(user.id),
-        email=user.email,
-        username=user.username,
-        full_name=user.full_name,
-        is_active=user.is_active
-    )
+    return user
 
 
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_ro)
 ):
     user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from pydantic import BaseModel
+from sqlalchemy import select, exists
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from uuid import UUID
+from datetime import datetime
 
-from core.database import get_db
-from services.auth import get_current_user
-from models import User, Channel, ChannelMember
+from core.database import get_db, get_db_ro
+from services.auth import CurrentUser, TokenClaims, get_current_user, get_current_user_claims, cache_membership
+from models import Channel, ChannelMember
 
 router = APIRouter()
 
@@ -19,21 +20,20 @@ class ChannelCreate(BaseModel):
 
 
 class ChannelResponse(BaseModel):
-    id: str
+    id: UUID
     name: str
     description: Optional[str]
     is_private: bool
-    owner_id: str
-    created_at: str
+    owner_id: UUID
+    created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 @router.post("/", response_model=ChannelResponse)
 async def create_channel(
     channel_data: ChannelCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     channel = Channel(
@@ -55,22 +55,15 @@ async def create_channel(
     db.add(member)
     
     await db.commit()
-    await db.refresh(channel)
+    await cache_membership(current_user.id, channel.id, member.role)
     
-    return ChannelResponse(
-        id=str(channel.id),
-        name=channel.name,
-        description=channel.description,
-        is_private=channel.is_private,
-        owner_id=str(channel.owner_id),
-        created_at=channel.created_at.isoformat()
-    )
+    return channel
 
 
 @router.get("/", response_model=List[ChannelResponse])
 async def list_channels(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: TokenClaims = Depends(get_current_user_claims),
+    db: AsyncSession = Depends(get_db_ro)
 ):
     # Get channels user is a member of
     result = await db.execute(
@@ -78,41 +71,30 @@ async def list_channels(
         .join(ChannelMember)
         .where(ChannelMember.user_id == current_user.id)
     )
-    channels = result.scalars().all()
-    
-    return [
-        ChannelResponse(
-            id=str(channel.id),
-            name=channel.name,
-            description=channel.description,
-            is_private=channel.is_private,
-            owner_id=str(channel.owner_id),
-            created_at=channel.created_at.isoformat()
-        )
-        for channel in channels
-    ]
+    return result.scalars().all()
 
 
 @router.post("/{channel_id}/join")
 async def join_channel(
     channel_id: UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     # Check if channel exists
-    result = await db.execute(select(Channel).where(Channel.id == channel_id))
-    channel = result.scalar_one_or_none()
+    channel_exists = await db.scalar(select(exists().where(Channel.id == channel_id)))
     
-    if not channel:
+    if not channel_exists:
         raise HTTPException(status_code=404, detail="Channel not found")
     
     # Check if already a member
-    result = await db.execute(
-        select(ChannelMember)
-        .where(ChannelMember.channel_id == channel_id)
-        .where(ChannelMember.user_id == current_user.id)
+    already_member = await db.scalar(
+        select(
+            exists()
+            .where(ChannelMember.channel_id == channel_id)
+            .where(ChannelMember.user_id == current_user.id)
+        )
     )
-    if result.scalar_one_or_none():
+    if already_member:
         raise HTTPException(status_code=400, detail="Already a member of this channel")
     
     # Add as member
@@ -123,5 +105,6 @@ async def join_channel(
     )
     db.add(member)
     await db.commit()
+    await cache_membership(current_user.id, channel_id, member.role)
     
     return {"message": "Successfully joined channel"}
\ No newline at end of file
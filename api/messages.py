@@ -1,15 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from sqlalchemy.orm import selectinload
+from sqlalchemy import select, and_, exists, insert, literal, tuple_
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Dict, Any, Tuple
 from uuid import UUID
 from datetime import datetime
+import base64
 
-from core.database import get_db
+from core.database import get_db, get_db_ro
 from core.websocket import manager
-from services.auth import get_current_user
-from models import User, Channel, ChannelMember, Message, Thread
+from services.auth import CurrentUser, TokenClaims, get_current_user, get_current_user_claims, is_member
+from models import User, Channel, ChannelMember, Message, Thread, uuid7
 
 router = APIRouter()
 
@@ -23,74 +25,105 @@ class MessageCreate(BaseModel):
 
 
 class MessageResponse(BaseModel):
-    id: str
-    channel_id: str
-    author_id: str
+    id: UUID
+    channel_id: UUID
+    author_id: UUID
     author_username: str
     content: str
     message_type: str
-    thread_id: Optional[str]
-    parent_message_id: Optional[str]
+    thread_id: Optional[UUID]
+    parent_message_id: Optional[UUID]
     is_edited: bool
-    created_at: str
+    created_at: datetime
     mentions: Optional[List[str]]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+def encode_cursor(created_at: datetime, message_id: UUID) -> str:
+    """Encode a (created_at, id) keyset position as an opaque cursor."""
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Optional[UUID]]:
+    """
+    Decode a pagination cursor.
+    A bare ISO timestamp is still accepted and pages by time alone.
+    """
+    try:
+        return datetime.fromisoformat(cursor), None
+    except ValueError:
+        pass
+    
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(message_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
 
 
 @router.post("/", response_model=MessageResponse)
 async def send_message(
     message_data: MessageCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    # Verify user is member of channel
-    result = await db.execute(
-        select(ChannelMember)
-        .where(and_(
-            ChannelMember.channel_id == message_data.channel_id,
-            ChannelMember.user_id == current_user.id
-        ))
+    # Insert the message only if the author is a member of the channel, in a
+    # single round-trip; RETURNING supplies the generated id and timestamp
+    membership = exists().where(and_(
+        ChannelMember.channel_id == message_data.channel_id,
+        ChannelMember.user_id == current_user.id
+    ))
+    values = {
+        "id": uuid7(),
+        "channel_id": message_data.channel_id,
+        "author_id": current_user.id,
+        "content": message_data.content,
+        "thread_id": message_data.thread_id,
+        "parent_message_id": message_data.parent_message_id,
+        "mentions": message_data.mentions,
+        "message_type": "text",
+        "is_edited": False,
+    }
+    stmt = (
+        insert(Message)
+        .from_select(
+            list(values),
+            select(*[
+                literal(value, Message.__table__.c[name].type)
+                for name, value in values.items()
+            ]).where(membership)
+        )
+        .returning(Message.id, Message.created_at)
     )
-    if not result.scalar_one_or_none():
+    
+    result = await db.execute(stmt)
+    row = result.first()
+    if row is None:
         raise HTTPException(status_code=403, detail="Not a member of this channel")
+    await db.commit()
     
-    # Create message
-    message = Message(
+    # Prepare response
+    response = MessageResponse(
+        id=row.id,
         channel_id=message_data.channel_id,
         author_id=current_user.id,
+        author_username=current_user.username,
         content=message_data.content,
+        message_type=values["message_type"],
         thread_id=message_data.thread_id,
         parent_message_id=message_data.parent_message_id,
-        mentions=message_data.mentions,
-        message_type="text"
-    )
-    
-    db.add(message)
-    await db.commit()
-    await db.refresh(message)
-    
-    # Prepare response
-    response = MessageResponse(
-        id=str(message.id),
-        channel_id=str(message.channel_id),
-        author_id=str(message.author_id),
-        author_username=current_user.username,
-        content=message.content,
-        message_type=message.message_type,
-        thread_id=str(message.thread_id) if message.thread_id else None,
-        parent_message_id=str(message.parent_message_id) if message.parent_message_id else None,
-        is_edited=message.is_edited,
-        created_at=message.created_at.isoformat(),
-        mentions=message.mentions
+        is_edited=values["is_edited"],
+        created_at=row.created_at,
+        mentions=message_data.mentions
     )
     
     # Broadcast to channel via WebSocket
     await manager.broadcast_to_channel(
         {
             "type": "new_message",
-            "message": response.dict()
+            "message": response.model_dump()
         },
         str(message_data.channel_id)
     )
@@ -101,48 +134,53 @@ async def send_message(
 @router.get("/channel/{channel_id}", response_model=List[MessageResponse])
 async def get_channel_messages(
     channel_id: UUID,
+    response: Response,
     limit: int = 50,
-    before: Optional[datetime] = None,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    before: Optional[str] = None,
+    current_user: TokenClaims = Depends(get_current_user_claims),
+    db: AsyncSession = Depends(get_db_ro)
 ):
     # Verify user is member of channel
-    result = await db.execute(
-        select(ChannelMember)
-        .where(and_(
-            ChannelMember.channel_id == channel_id,
-            ChannelMember.user_id == current_user.id
-        ))
-    )
-    if not result.scalar_one_or_none():
+    if not await is_member(db, current_user.id, channel_id):
         raise HTTPException(status_code=403, detail="Not a member of this channel")
     
-    # Build query
-    query = select(Message, User).join(User).where(
-        Message.channel_id == channel_id
+    # Build query; authors are fetched once per distinct user by selectinload
+    query = (
+        select(Message)
+        .options(selectinload(Message.author).load_only(User.username))
+        .where(Message.channel_id == channel_id)
     )
     
     if before:
-        query = query.where(Message.created_at < before)
+        before_ts, before_id = decode_cursor(before)
+        if before_id is None:
+            query = query.where(Message.created_at < before_ts)
+        else:
+            query = query.where(tuple_(Message.created_at, Message.id) < (before_ts, before_id))
     
-    query = query.order_by(Message.created_at.desc()).limit(limit)
+    query = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit)
     
     result = await db.execute(query)
-    messages = result.all()
+    messages = result.scalars().all()
+    
+    if len(messages) == limit:
+        oldest = messages[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(oldest.created_at, oldest.id)
     
+    # Reverse to get chronological order
     return [
         MessageResponse(
-            id=str(message.id),
-            channel_id=str(message.channel_id),
-            author_id=str(message.author_id),
-            author_username=user.username,
+            id=message.id,
+            channel_id=message.channel_id,
+            author_id=message.author_id,
+            author_username=message.author.username,
             content=message.content,
             message_type=message.message_type,
-            thread_id=str(message.thread_id) if message.thread_id else None,
-            parent_message_id=str(message.parent_message_id) if message.parent_message_id else None,
+            thread_id=message.thread_id,
+            parent_message_id=message.parent_message_id,
             is_edited=message.is_edited,
-            created_at=message.created_at.isoformat(),
+            created_at=message.created_at,
             mentions=message.mentions
         )
-        for message, user in messages
-    ][::-1]  # Reverse to get chronological order
\ No newline at end of file
+        for message in reversed(messages)
+    ]
\ No newline at end of file
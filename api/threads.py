@@ -1,17 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, update
-from pydantic import BaseModel
+from sqlalchemy.orm import selectinload
+from sqlalchemy import select, and_, update, exists
+from pydantic import BaseModel, ConfigDict
+from redis.exceptions import RedisError
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 from datetime import datetime
+import logging
 
-from core.database import get_db
-from core.websocket import manager
-from services.auth import get_current_user
+from core.database import get_db, get_db_ro
+from services.auth import CurrentUser, TokenClaims, get_current_user, get_current_user_claims, is_member
 from models import User, Channel, ChannelMember, Message, Thread
-from llm.llm_handler import llm_handler
+from services.llm_queue import enqueue_llm_query, enqueue_schema_warmup
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
@@ -25,19 +28,18 @@ class ThreadCreate(BaseModel):
 
 
 class ThreadResponse(BaseModel):
-    id: str
-    channel_id: str
-    root_message_id: str
+    id: UUID
+    channel_id: UUID
+    root_message_id: UUID
     title: Optional[str]
     is_llm_enabled: bool
     message_count: int
     participant_count: int
-    created_at: str
+    created_at: datetime
     allowed_databases: Optional[List[str]]
     allowed_tables: Optional[List[str]]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class LLMQueryRequest(BaseModel):
@@ -49,18 +51,12 @@ class LLMQueryRequest(BaseModel):
 @router.post("/", response_model=ThreadResponse)
 async def create_thread(
     thread_data: ThreadCreate,
-    current_user: User = Depends(get_current_user),
+    background_tasks: BackgroundTasks,
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     # Verify user has access to channel
-    result = await db.execute(
-        select(ChannelMember)
-        .where(and_(
-            ChannelMember.channel_id == thread_data.channel_id,
-            ChannelMember.user_id == current_user.id
-        ))
-    )
-    if not result.scalar_one_or_none():
+    if not await is_member(db, current_user.id, thread_data.channel_id):
         raise HTTPException(status_code=403, detail="Not a member of this channel")
     
     # Create thread
@@ -77,49 +73,44 @@ async def create_thread(
     
     db.add(thread)
     await db.commit()
-    await db.refresh(thread)
     
-    return ThreadResponse(
-        id=str(thread.id),
-        channel_id=str(thread.channel_id),
-        root_message_id=str(thread.root_message_id),
-        title=thread.title,
-        is_llm_enabled=thread.is_llm_enabled,
-        message_count=thread.message_count,
-        participant_count=thread.participant_count,
-        created_at=thread.created_at.isoformat(),
-        allowed_databases=thread.allowed_databases,
-        allowed_tables=thread.allowed_tables
-    )
+    # Have the LLM workers cache the schemas before the first query arrives
+    if thread.is_llm_enabled:
+        background_tasks.add_task(enqueue_schema_warmup, thread.allowed_tables)
+    
+    return thread
 
 
-@router.post("/{thread_id}/llm-query")
+@router.post("/{thread_id}/llm-query", status_code=status.HTTP_202_ACCEPTED)
 async def execute_llm_query(
     thread_id: UUID,
     query_request: LLMQueryRequest,
-    background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    # Get thread
-    result = await db.execute(select(Thread).where(Thread.id == thread_id))
-    thread = result.scalar_one_or_none()
+    # Get thread and the user's access to its channel in one round trip
+    result = await db.execute(
+        select(
+            Thread,
+            exists().where(and_(
+                ChannelMember.channel_id == Thread.channel_id,
+                ChannelMember.user_id == current_user.id
+            )).label("is_member")
+        )
+        .where(Thread.id == thread_id)
+    )
+    row = result.one_or_none()
     
-    if not thread:
+    if not row:
         raise HTTPException(status_code=404, detail="Thread not found")
     
+    thread, thread_member = row
+    
     if not thread.is_llm_enabled:
         raise HTTPException(status_code=400, detail="LLM is not enabled for this thread")
     
     # Verify user has access to channel
-    result = await db.execute(
-        select(ChannelMember)
-        .where(and_(
-            ChannelMember.channel_id == thread.channel_id,
-            ChannelMember.user_id == current_user.id
-        ))
-    )
-    if not result.scalar_one_or_none():
+    if not thread_member:
         raise HTTPException(status_code=403, detail="Not a member of this channel")
     
     # Create user message
@@ -133,16 +124,24 @@ async def execute_llm_query(
     db.add(user_message)
     await db.flush()
     
-    # Process in background
-    background_tasks.add_task(
-        process_llm_query_task,
-        thread_id=str(thread_id),
-        channel_id=str(thread.channel_id),
-        user_query=query_request.query,
-        allowed_tables=thread.allowed_tables,
-        context=query_request.context
-    )
-    
+    # Hand off to the LLM workers; the response arrives over WebSocket.
+    # Queued before the commit, so a client retrying after a failure
+    # never leaves a duplicate message behind
+    try:
+        await enqueue_llm_query(
+            thread_id=str(thread_id),
+            channel_id=str(thread.channel_id),
+            user_query=query_request.query,
+            allowed_tables=thread.allowed_tables,
+            context=query_request.context
+        )
+    except RedisError as e:
+        # get_db rolls the unsent message back
+        logger.warning(f"Could not queue LLM query: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="LLM queue unavailable, please retry"
+        )
     await db.commit()
     
     return {
@@ -151,67 +150,12 @@ async def execute_llm_query(
     }
 
 
-async def process_llm_query_task(
-    thread_id: str,
-    channel_id: str,
-    user_query: str,
-    allowed_tables: Optional[List[str]],
-    context: Optional[Dict[str, Any]]
-):
-    """Background task to process LLM query and send results via WebSocket."""
-    
-    # Process the data request
-    result = await llm_handler.process_data_request(
-        user_prompt=user_query,
-        allowed_tables=allowed_tables,
-        enterprise_context=context
-    )
-    
-    # Create LLM response message
-    from core.database import AsyncSessionLocal
-    
-    async with AsyncSessionLocal() as db:
-        llm_message = Message(
-            channel_id=UUID(channel_id),
-            author_id=UUID("00000000-0000-0000-0000-000000000000"),  # System user
-            thread_id=UUID(thread_id),
-            content=result.get("formatted_results", result.get("message", "Error processing query")),
-            message_type="llm_response",
-            llm_context={
-                "query": user_query,
-                "sql_query": result.get("sql_query"),
-                "row_count": result.get("row_count"),
-                "success": result.get("success"),
-                "error": result.get("error")
-            },
-            llm_model_used=result.get("model_used")
-        )
-        
-        db.add(llm_message)
-        await db.commit()
-        
-        # Broadcast via WebSocket
-        await manager.broadcast_to_channel(
-            {
-                "type": "llm_response",
-                "thread_id": thread_id,
-                "message": {
-                    "id": str(llm_message.id),
-                    "content": llm_message.content,
-                    "llm_context": llm_message.llm_context,
-                    "created_at": llm_message.created_at.isoformat()
-                }
-            },
-            channel_id
-        )
-
-
 @router.get("/{thread_id}/messages", response_model=List[Dict[str, Any]])
 async def get_thread_messages(
     thread_id: UUID,
     limit: int = 50,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: TokenClaims = Depends(get_current_user_claims),
+    db: AsyncSession = Depends(get_db_ro)
 ):
     # Get thread
     result = await db.execute(select(Thread).where(Thread.id == thread_id))
@@ -221,36 +165,29 @@ async def get_thread_messages(
         raise HTTPException(status_code=404, detail="Thread not found")
     
     # Verify user has access
-    result = await db.execute(
-        select(ChannelMember)
-        .where(and_(
-            ChannelMember.channel_id == thread.channel_id,
-            ChannelMember.user_id == current_user.id
-        ))
-    )
-    if not result.scalar_one_or_none():
+    if not await is_member(db, current_user.id, thread.channel_id):
         raise HTTPException(status_code=403, detail="Not a member of this channel")
     
     # Get messages
     result = await db.execute(
-        select(Message, User)
-        .join(User, Message.author_id == User.id, isouter=True)
+        select(Message)
+        .options(selectinload(Message.author).load_only(User.username))
         .where(Message.thread_id == thread_id)
         .order_by(Message.created_at.desc())
         .limit(limit)
     )
     
-    messages = result.all()
+    messages = result.scalars().all()
     
     return [
         {
-            "id": str(message.id),
-            "author_id": str(message.author_id),
-            "author_username": user.username if user else "System",
+            "id": message.id,
+            "author_id": message.author_id,
+            "author_username": message.author.username if message.author else "System",
             "content": message.content,
             "message_type": message.message_type,
             "llm_context": message.llm_context,
-            "created_at": message.created_at.isoformat()
+            "created_at": message.created_at
         }
-        for message, user in messages
-    ][::-1]
\ No newline at end of file
+        for message in reversed(messages)
+    ]
\ No newline at end of file
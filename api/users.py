@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from pydantic import BaseModel
-from typing import Optional
+from sqlalchemy import update
+from pydantic import BaseModel, ConfigDict
+from typing import Literal, Optional
 from uuid import UUID
 
-from core.database import get_db
-from services.auth import get_current_user
+from core.database import get_db, get_db_ro
+from services.auth import CurrentUser, get_current_user, invalidate_user_session
 from models import User
 
 router = APIRouter()
@@ -15,11 +15,11 @@ router = APIRouter()
 class UserUpdate(BaseModel):
     full_name: Optional[str] = None
     avatar_url: Optional[str] = None
-    status: Optional[str] = None
+    status: Optional[Literal["online", "offline", "away", "busy"]] = None
 
 
 class UserResponse(BaseModel):
-    id: str
+    id: UUID
     email: str
     username: str
     full_name: Optional[str]
@@ -27,32 +27,23 @@ class UserResponse(BaseModel):
     status: str
     is_active: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    return UserResponse(
-        id=str(current_user.id),
-        email=current_user.email,
-        username=current_user.username,
-        full_name=current_user.full_name,
-        avatar_url=current_user.avatar_url,
-        status=current_user.status,
-        is_active=current_user.is_active
-    )
+    return current_user
 
 
 @router.patch("/me", response_model=UserResponse)
 async def update_current_user(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    update_data = user_update.dict(exclude_unset=True)
+    update_data = user_update.model_dump(exclude_unset=True)
     
     if update_data:
         stmt = (
@@ -63,38 +54,22 @@ async def update_current_user(
         await db.execute(stmt)
         await db.commit()
         
-        # Refresh user data
-        await db.refresh(current_user)
+        # Drop the cached session snapshot and reload the updated row
+        await invalidate_user_session(str(current_user.id))
+        current_user = await db.get(User, current_user.id)
     
-    return UserResponse(
-        id=str(current_user.id),
-        email=current_user.email,
-        username=current_user.username,
-        full_name=current_user.full_name,
-        avatar_url=current_user.avatar_url,
-        status=current_user.status,
-        is_active=current_user.is_active
-    )
+    return current_user
 
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_ro)
 ):
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await db.get(User, user_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return UserResponse(
-        id=str(user.id),
-        email=user.email,
-        username=user.username,
-        full_name=user.full_name,
-        avatar_url=user.avatar_url,
-        status=user.status,
-        is_active=user.is_active
-    )
\ No newline at end of file
+    return user
\ No newline at end of file
@@ -11,6 +11,13 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str
+    database_pgbouncer: bool = False  # Connect through PgBouncer in transaction mode; needs server_reset_query = DISCARD ALL
+    sql_echo: bool = False  # Log every SQL statement
+    database_pool_size: int = 30  # Ignored with PgBouncer, which owns the pool
+    database_max_overflow: int = 20
+    database_pool_recycle_seconds: int = 3600
+    database_pool_pre_ping: bool = True  # SELECT 1 on every pool checkout
+    database_pool_warm: int = 2  # Connections opened per process at startup
     redis_url: str
     
     # Snowflake
@@ -21,12 +28,22 @@ class Settings(BaseSettings):
     snowflake_database: str
     snowflake_schema: str = "PUBLIC"
     snowflake_role: str = "READONLY_ROLE"
+    snowflake_pool_size: int = 4  # Idle connections kept open between queries
+    snowflake_metadata_ttl_seconds: int = 300  # How long table lists/schemas are cached
     
     # LLM
     openai_api_key: str
     llm_model: str = "gpt-4-turbo-preview"
     llm_temperature: float = 0.1
     llm_max_tokens: int = 2000
+    llm_request_timeout_seconds: float = 60.0  # Per OpenAI attempt; the client's default is 600
+    llm_max_retries: int = 2
+    llm_cache_size: int = 1024  # Answers kept per process; used only at temperature 0
+    llm_cache_ttl_seconds: int = 300
+    llm_queue_maxlen: int = 10000  # Approximate cap on the Redis job stream
+    llm_worker_concurrency: int = 4  # Concurrent jobs per llm_worker.py process
+    llm_queue_claim_idle_seconds: int = 300  # Unacknowledged jobs idle this long are taken over; jobs are cut off well before
+    llm_queue_claim_interval_seconds: int = 60
     
     # Security
     secret_key: str
@@ -34,10 +51,26 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int = 30
     refresh_token_expire_days: int = 7
     
+    # Caching
+    membership_cache_ttl_seconds: int = 300
+    membership_negative_ttl_seconds: int = 30
+    token_cache_size: int = 10000  # Decoded JWTs kept in process memory
+    token_cache_ttl_seconds: int = 30
+    user_cache_size: int = 5000  # In-process copies of the Redis session snapshot
+    user_cache_ttl_seconds: int = 30
+    
     # Rate limiting
     rate_limit_per_minute: int = 60
     websocket_rate_limit: int = 100
     
+    # WebSocket transport
+    websocket_flush_interval_ms: int = 5  # Coalescing window for batched clients
+    websocket_per_message_deflate: bool = True
+    websocket_send_timeout_seconds: float = 0.25  # Slower sends evict the client
+    websocket_send_queue_size: int = 1000
+    websocket_ping_interval_seconds: float = 30.0
+    websocket_ping_timeout_seconds: float = 20.0
+    
     class Config:
         env_file = ".env"
 
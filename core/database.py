@@ -1,24 +1,55 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from config.settings import get_settings
 from typing import AsyncGenerator
+from uuid import uuid4
+import asyncio
 
 settings = get_settings()
 
+if settings.database_pgbouncer:
+    # PgBouncer (transaction mode) owns the pool; asyncpg must not keep
+    # prepared statements since consecutive queries may hit different backends.
+    # The adapter still prepares each statement, so names must be unique
+    # across clients rather than asyncpg's per-connection __asyncpg_stmt_N__
+    pool_options = {
+        "poolclass": NullPool,
+        "connect_args": {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        },
+    }
+else:
+    # The asyncio-aware queue pool; plain QueuePool blocks the event loop
+    pool_options = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_recycle": settings.database_pool_recycle_seconds,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+        # Server-side keepalives stop firewalls/NAT silently dropping idle pooled connections
+        "connect_args": {"server_settings": {"tcp_keepalives_idle": "30"}},
+    }
+
 engine = create_async_engine(
     settings.database_url,
-    echo=settings.debug,
+    echo=settings.sql_echo,
     future=True,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,
+    **pool_options,
 )
 
-AsyncSessionLocal = sessionmaker(
+AsyncSessionLocal = async_sessionmaker(
     engine,
-    class_=AsyncSession,
     expire_on_commit=False,
-    autocommit=False,
+    autoflush=False,
+)
+
+# Read-only sessions run in autocommit mode on the same pool, so a request
+# that only SELECTs pays no BEGIN/COMMIT round-trips
+ReadOnlySessionLocal = async_sessionmaker(
+    engine.execution_options(isolation_level="AUTOCOMMIT"),
+    expire_on_commit=False,
     autoflush=False,
 )
 
@@ -35,6 +66,25 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_db_ro() -> AsyncGenerator[AsyncSession, None]:
+    async with ReadOnlySessionLocal() as session:
+        yield session
+
+
+async def warm_pool():
+    """
+    Open a few connections before the first request. Not the whole pool:
+    every worker process warms at once, and the sum must stay well under
+    Postgres's max_connections.
+    """
+    if settings.database_pgbouncer:
+        return
+    count = min(settings.database_pool_warm, engine.pool.size())
+    connections = await asyncio.gather(*(engine.connect() for _ in range(count)))
+    for conn in connections:
+        await conn.close()
+
+
 async def init_db():
     from models import Base
     async with engine.begin() as conn:
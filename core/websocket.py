@@ -1,62 +1,213 @@
-from typing import Dict, Set, List
-from fastapi import WebSocket
-import json
+from typing import Dict, Set, List, Optional
+from fastapi import WebSocket, status
+from redis.exceptions import RedisError
+import orjson
 import asyncio
 from datetime import datetime
+import logging
 import uuid
 
+from config.settings import get_settings
+from core.cache import redis_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CHANNEL_PREFIX = "ch:"
+MAX_FRAMES_PER_FLUSH = 64
+
 
 class ConnectionManager:
+    """
+    Tracks local WebSocket connections and channel subscriptions.
+    User and channel UUID strings are interned to sequential ints on first
+    use so the membership maps hold small ints rather than 36-char strings.
+    """
+    
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.user_channels: Dict[str, Set[str]] = {}
-        self.channel_users: Dict[str, Set[str]] = {}
+        self._user_ids: Dict[str, int] = {}
+        self._user_names: List[str] = []
+        self._channel_ids: Dict[str, int] = {}
+        self._channel_names: List[str] = []
+        self.active_connections: Dict[int, WebSocket] = {}
+        self.user_channels: Dict[int, Set[int]] = {}
+        self.channel_users: Dict[int, Set[int]] = {}
+        self.send_queues: Dict[int, asyncio.Queue] = {}
+        self.writers: Dict[int, asyncio.Task] = {}
+        self._closing: Set[asyncio.Task] = set()
+    
+    def _intern_user(self, user_id: str) -> int:
+        uid = self._user_ids.get(user_id)
+        if uid is None:
+            uid = self._user_ids[user_id] = len(self._user_names)
+            self._user_names.append(user_id)
+        return uid
+    
+    def _intern_channel(self, channel_id: str) -> int:
+        cid = self._channel_ids.get(channel_id)
+        if cid is None:
+            cid = self._channel_ids[channel_id] = len(self._channel_names)
+            self._channel_names.append(channel_id)
+        return cid
         
-    async def connect(self, websocket: WebSocket, user_id: str):
+    async def connect(self, websocket: WebSocket, user_id: str, batched: bool = False):
         await websocket.accept()
-        self.active_connections[user_id] = websocket
+        uid = self._intern_user(user_id)
+        if uid in self.writers:
+            self.writers.pop(uid).cancel()
+        self.active_connections[uid] = websocket
+        queue = asyncio.Queue(maxsize=settings.websocket_send_queue_size)
+        self.send_queues[uid] = queue
+        self.writers[uid] = asyncio.create_task(self._writer(uid, websocket, queue, batched))
+        
+    def disconnect(self, user_id: str, websocket: Optional[WebSocket] = None):
+        """
+        Forget a user's connection and channel subscriptions.
+        When websocket is given, nothing happens unless it is still the
+        user's active connection (the user may already have reconnected).
+        """
+        uid = self._user_ids.get(user_id)
+        if uid is None:
+            return
+        if websocket is not None and self.active_connections.get(uid) is not websocket:
+            return
         
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+        self.active_connections.pop(uid, None)
+        self.send_queues.pop(uid, None)
+        writer = self.writers.pop(uid, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
             
         # Remove user from all channels
-        if user_id in self.user_channels:
-            for channel_id in self.user_channels[user_id]:
-                if channel_id in self.channel_users:
-                    self.channel_users[channel_id].discard(user_id)
-            del self.user_channels[user_id]
+        for cid in self.user_channels.pop(uid, ()):
+            self._discard_member(cid, uid)
     
-    def add_user_to_channel(self, user_id: str, channel_id: str):
-        if user_id not in self.user_channels:
-            self.user_channels[user_id] = set()
-        self.user_channels[user_id].add(channel_id)
+    def _evict(self, uid: int, websocket: WebSocket, reason: str):
+        """Drop a slow or dead connection and close its socket in the background."""
+        if self.active_connections.get(uid) is not websocket:
+            return
+        user_id = self._user_names[uid]
+        logger.info(f"Dropping WebSocket for user {user_id}: {reason}")
+        self.disconnect(user_id, websocket)
         
-        if channel_id not in self.channel_users:
-            self.channel_users[channel_id] = set()
-        self.channel_users[channel_id].add(user_id)
+        task = asyncio.create_task(self._close(websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+    
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(
+                websocket.close(code=status.WS_1011_INTERNAL_ERROR),
+                timeout=settings.websocket_send_timeout_seconds
+            )
+        except Exception:
+            pass
+    
+    def _discard_member(self, cid: int, uid: int):
+        members = self.channel_users.get(cid)
+        if members is not None:
+            members.discard(uid)
+            if not members:
+                del self.channel_users[cid]
+    
+    def add_user_to_channel(self, user_id: str, channel_id: str):
+        uid = self._intern_user(user_id)
+        cid = self._intern_channel(channel_id)
+        self.user_channels.setdefault(uid, set()).add(cid)
+        self.channel_users.setdefault(cid, set()).add(uid)
     
     def remove_user_from_channel(self, user_id: str, channel_id: str):
-        if user_id in self.user_channels:
-            self.user_channels[user_id].discard(channel_id)
-        if channel_id in self.channel_users:
-            self.channel_users[channel_id].discard(user_id)
+        uid = self._user_ids.get(user_id)
+        cid = self._channel_ids.get(channel_id)
+        if uid is None or cid is None:
+            return
+        if uid in self.user_channels:
+            self.user_channels[uid].discard(cid)
+        self._discard_member(cid, uid)
+    
+    async def _writer(self, uid: int, websocket: WebSocket, queue: asyncio.Queue, batched: bool):
+        """
+        Drain a connection's outbound queue.
+        Batched clients receive every frame queued within one flush interval
+        as a single JSON array; others receive one frame per message.
+        A send that exceeds the timeout or fails evicts the connection.
+        """
+        flush_interval = settings.websocket_flush_interval_ms / 1000
+        timeout = settings.websocket_send_timeout_seconds
+        try:
+            while True:
+                frames = [await queue.get()]
+                if batched:
+                    await asyncio.sleep(flush_interval)
+                while not queue.empty() and len(frames) < MAX_FRAMES_PER_FLUSH:
+                    frames.append(queue.get_nowait())
+                
+                if batched:
+                    await asyncio.wait_for(
+                        websocket.send_text("[" + ",".join(frames) + "]"), timeout
+                    )
+                else:
+                    for frame in frames:
+                        await asyncio.wait_for(websocket.send_text(frame), timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._evict(uid, websocket, "send timed out")
+        except Exception as e:
+            self._evict(uid, websocket, f"send failed: {str(e)}")
+    
+    def _enqueue(self, uid: int, frame: str):
+        queue = self.send_queues.get(uid)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self._evict(uid, self.active_connections[uid], "send queue full")
     
     async def send_personal_message(self, message: dict, user_id: str):
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            await websocket.send_json(message)
+        uid = self._user_ids.get(user_id)
+        if uid is not None:
+            self._enqueue(uid, orjson.dumps(message).decode())
     
     async def broadcast_to_channel(self, message: dict, channel_id: str, exclude_user: str = None):
-        if channel_id in self.channel_users:
-            tasks = []
-            for user_id in self.channel_users[channel_id]:
-                if user_id != exclude_user and user_id in self.active_connections:
-                    websocket = self.active_connections[user_id]
-                    tasks.append(websocket.send_json(message))
-            
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+        """Publish a channel message so every worker can relay it to its own sockets."""
+        envelope = {"message": message, "exclude_user": exclude_user}
+        await redis_client.publish(f"{CHANNEL_PREFIX}{channel_id}", orjson.dumps(envelope))
+    
+    async def listen(self):
+        """Relay channel broadcasts published by any worker to local connections."""
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                async for event in pubsub.listen():
+                    if event["type"] != "pmessage":
+                        continue
+                    # One bad event must not end the relay for every channel
+                    try:
+                        channel_id = event["channel"][len(CHANNEL_PREFIX):]
+                        envelope = orjson.loads(event["data"])
+                        await self.send_to_local_channel(
+                            envelope["message"], channel_id, envelope.get("exclude_user")
+                        )
+                    except Exception:
+                        logger.exception(f"Could not relay broadcast on {event.get('channel')}")
+            except RedisError as e:
+                logger.warning(f"Channel subscription lost, reconnecting: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+    
+    async def send_to_local_channel(self, message: dict, channel_id: str, exclude_user: str = None):
+        members = self.channel_users.get(self._channel_ids.get(channel_id))
+        if members:
+            # Serialize once and share the frame across every recipient
+            payload = orjson.dumps(message).decode()
+            excluded = self._user_ids.get(exclude_user) if exclude_user else None
+            for uid in list(members):
+                if uid != excluded:
+                    self._enqueue(uid, payload)
     
     async def broadcast_typing_indicator(self, channel_id: str, user_id: str, is_typing: bool):
         message = {
@@ -77,9 +228,9 @@ class ConnectionManager:
         }
         
         # Notify all channels the user is in
-        if user_id in self.user_channels:
-            for channel_id in self.user_channels[user_id]:
-                await self.broadcast_to_channel(message, channel_id)
+        uid = self._user_ids.get(user_id)
+        for cid in list(self.user_channels.get(uid, ())):
+            await self.broadcast_to_channel(message, self._channel_names[cid])
 
 
 manager = ConnectionManager()
\ No newline at end of file
@@ -1,14 +1,79 @@
 import snowflake.connector
-from snowflake.connector import DictCursor
-from typing import List, Dict, Any, Optional
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from typing import List, Dict, Any, Optional, Tuple
 from contextlib import contextmanager
+from functools import lru_cache
+from itertools import groupby, islice
+from operator import itemgetter
 import logging
+import queue
+import threading
+import time
 
 from config.settings import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Statements that may not appear anywhere in a read query; CALL, EXECUTE
+# and other unsupported syntax parse as Command
+_WRITE_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Drop, exp.Create, exp.Alter,
+    exp.TruncateTable, exp.Merge, exp.Command
+)
+
+
+@lru_cache(maxsize=512)
+def _parse(query: str) -> Optional[exp.Expression]:
+    """Parse a query once; callers must copy the tree before changing it."""
+    try:
+        return sqlglot.parse_one(query, read='snowflake')
+    except SqlglotError:
+        return None
+
+
+@lru_cache(maxsize=512)
+def _query_violation(query: str) -> Optional[str]:
+    """
+    Why a query may not run, or None if it is a safe read.
+    Cached so validating and then executing the same query scans it once.
+    """
+    # Parsed rather than scanned: CTEs and comments are fine, and a
+    # keyword inside a string or identifier is not a statement
+    tree = _parse(query)
+    if tree is None:
+        return "Query could not be parsed"
+    
+    # SELECT, WITH ... SELECT or a set operation; several statements parse as a Block
+    if not isinstance(tree, exp.Query):
+        return "Only SELECT queries are allowed"
+    
+    forbidden = tree.find(*_WRITE_NODES)
+    if forbidden is not None:
+        return f"Query contains forbidden operation: {forbidden.key.upper()}"
+    
+    return None
+
+
+def _with_limit(query: str, limit: int) -> str:
+    """
+    Cap a validated query at `limit` rows by setting its own top-level
+    LIMIT. Not wrapped in an outer SELECT, which would not keep an
+    inner ORDER BY and could return an arbitrary `limit` rows.
+    """
+    tree = _parse(query)
+    existing = tree.args.get("limit")
+    if existing is not None:
+        # LIMIT n / TOP n, or FETCH FIRST n ROWS
+        count = existing.expression if isinstance(existing, exp.Limit) else existing.args.get("count")
+        if not (isinstance(count, exp.Literal) and count.is_int):
+            # e.g. a bind parameter; the fetch stops at `limit` rows anyway
+            return query
+        limit = min(int(count.this), limit)
+    return tree.limit(limit).sql(dialect='snowflake')
+
 
 class SnowflakeConnector:
     def __init__(self):
@@ -19,18 +84,45 @@ class SnowflakeConnector:
             'warehouse': settings.snowflake_warehouse,
             'database': settings.snowflake_database,
             'schema': settings.snowflake_schema,
-            'role': settings.snowflake_role
+            'role': settings.snowflake_role,
+            'client_session_keep_alive': True
         }
+        # Idle connections, handed out most recently used first; keep-alive
+        # stops Snowflake expiring the sessions while they wait
+        self._pool = queue.LifoQueue(maxsize=settings.snowflake_pool_size)
+        
+        # Table metadata, as (fetched_at, value) on the monotonic clock
+        self._cache_lock = threading.Lock()
+        self._table_list_cache: Optional[Tuple[float, List[str]]] = None
+        self._schema_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
     
     @contextmanager
     def get_connection(self):
         conn = None
+        while conn is None:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = snowflake.connector.connect(**self.connection_params)
+                break
+            if conn.is_closed():
+                conn = None
+        
         try:
-            conn = snowflake.connector.connect(**self.connection_params)
             yield conn
         finally:
-            if conn:
-                conn.close()
+            if not conn.is_closed():
+                try:
+                    self._pool.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+    
+    def warmup(self):
+        """Open (or revive) a pooled connection ahead of a query."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
     
     def execute_read_query(
         self,
@@ -42,34 +134,70 @@ class SnowflakeConnector:
         Execute a read-only query on Snowflake.
         Enforces SELECT-only queries and result limits.
         """
-        # Basic validation - ensure it's a SELECT query
-        query_upper = query.strip().upper()
-        if not query_upper.startswith('SELECT'):
-            raise ValueError("Only SELECT queries are allowed")
+        columns, rows = self.execute_read_query_rowset(query, params, limit)
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def execute_read_query_rowset(
+        self,
+        query: str,
+        params: Optional[Dict[str, Any]] = None,
+        limit: int = 1000
+    ) -> Tuple[List[str], List[tuple]]:
+        """
+        Like execute_read_query, but returns (column names, row tuples)
+        without building a dict per row.
+        """
+        # Must be a SELECT query without dangerous keywords
+        violation = _query_violation(query)
+        if violation:
+            raise ValueError(violation)
         
-        # Check for dangerous keywords
-        dangerous_keywords = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE']
-        for keyword in dangerous_keywords:
-            if keyword in query_upper:
-                raise ValueError(f"Query contains forbidden keyword: {keyword}")
+        if not isinstance(limit, int) or limit < 0:
+            raise ValueError("limit must be a non-negative integer")
         
-        # Add limit if not present
-        if 'LIMIT' not in query_upper:
-            query = f"{query} LIMIT {limit}"
+        # Cap the result in the query itself, keeping any smaller LIMIT
+        query = _with_limit(query, limit)
         
+        return self._fetch_rowset(query, params, limit=limit)
+    
+    def _fetch(
+        self,
+        query: str,
+        params: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Run a query as-is; for trusted internal metadata queries."""
+        columns, rows = self._fetch_rowset(query, params)
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def _fetch_rowset(
+        self,
+        query: str,
+        params: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[str], List[tuple]]:
+        """
+        Run a query as-is and return (column names, row tuples).
+        At most `limit` rows are read from the cursor when given.
+        """
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor(DictCursor)
+                cursor = conn.cursor()
                 
                 if params:
                     cursor.execute(query, params)
                 else:
                     cursor.execute(query)
                 
-                results = cursor.fetchall()
+                if limit is None:
+                    results = cursor.fetchall()
+                else:
+                    # Stop after `limit` rows even if the query's own LIMIT
+                    # is larger; later result chunks are never downloaded
+                    results = list(islice(cursor, limit))
+                columns = [column.name for column in cursor.description]
                 cursor.close()
                 
-                return results
+                return columns, results
                 
         except Exception as e:
             logger.error(f"Error executing Snowflake query: {str(e)}")
@@ -77,66 +205,114 @@ class SnowflakeConnector:
     
     def get_table_schema(self, table_name: str) -> List[Dict[str, Any]]:
         """Get schema information for a specific table."""
-        query = """
+        return self.get_tables_schemas([table_name]).get(table_name, [])
+    
+    def get_tables_schemas(self, table_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get schema information for several tables in one query.
+        Schemas fetched within the metadata TTL are served from memory.
+        """
+        now = time.monotonic()
+        schemas = {}
+        with self._cache_lock:
+            # Drop expired entries so the cache only holds live tables
+            expired = [
+                table for table, (fetched_at, _) in self._schema_cache.items()
+                if now - fetched_at >= settings.snowflake_metadata_ttl_seconds
+            ]
+            for table in expired:
+                del self._schema_cache[table]
+            
+            for table in table_names:
+                if table in self._schema_cache:
+                    schemas[table] = self._schema_cache[table][1]
+        
+        missing = [table for table in table_names if table not in schemas]
+        if missing:
+            fetched = self._fetch_tables_schemas(missing)
+            with self._cache_lock:
+                for table, columns in fetched.items():
+                    self._schema_cache[table] = (now, columns)
+            schemas.update(fetched)
+        
+        return schemas
+    
+    def _fetch_tables_schemas(self, table_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        params = {f't{i}': name for i, name in enumerate(table_names)}
+        placeholders = ", ".join(f"%({key})s" for key in params)
+        params['schema'] = settings.snowflake_schema
+        
+        query = f"""
         SELECT 
+            TABLE_NAME,
             COLUMN_NAME,
             DATA_TYPE,
             IS_NULLABLE,
             COLUMN_DEFAULT,
             COMMENT
         FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_NAME = %(table_name)s
+        WHERE TABLE_NAME IN ({placeholders})
             AND TABLE_SCHEMA = %(schema)s
-        ORDER BY ORDINAL_POSITION
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
         """
         
-        return self.execute_read_query(
-            query,
-            params={
-                'table_name': table_name,
-                'schema': settings.snowflake_schema
-            }
-        )
+        # No LIMIT: every column of every requested table is needed
+        results = self._fetch(query, params)
+        
+        return {
+            table: list(columns)
+            for table, columns in groupby(results, key=itemgetter('TABLE_NAME'))
+        }
     
     def list_available_tables(self) -> List[str]:
         """List all tables available in the current schema."""
-        query = """
-        SELECT TABLE_NAME
-        FROM INFORMATION_SCHEMA.TABLES
-        WHERE TABLE_SCHEMA = %(schema)s
-            AND TABLE_TYPE IN ('BASE TABLE', 'VIEW')
-        ORDER BY TABLE_NAME
-        """
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._table_list_cache
+        if cached and now - cached[0] < settings.snowflake_metadata_ttl_seconds:
+            return cached[1]
+        
+        # SHOW is answered from Snowflake's metadata layer without a warehouse
+        tables = sorted(self._show_names('TABLES') + self._show_names('VIEWS'))
+        with self._cache_lock:
+            self._table_list_cache = (now, tables)
         
-        results = self.execute_read_query(
-            query,
-            params={'schema': settings.snowflake_schema}
-        )
+        return tables
+    
+    # Rows per SHOW call; Snowflake's own cap
+    SHOW_PAGE_SIZE = 10000
+    
+    def _show_names(self, kind: str) -> List[str]:
+        """Names of all objects of a kind (TABLES, VIEWS) in the schema."""
+        first_page = f"SHOW TERSE {kind} IN SCHEMA IDENTIFIER(%(schema)s) LIMIT {self.SHOW_PAGE_SIZE}"
+        query = first_page
+        params = {'schema': settings.snowflake_schema}
+        names = []
         
-        return [row['TABLE_NAME'] for row in results]
+        while True:
+            rows = self._fetch(query, params)
+            names.extend(row['name'] for row in rows)
+            if len(rows) < self.SHOW_PAGE_SIZE:
+                return names
+            # SHOW output is sorted by name; the next page starts after the last one
+            query = f"{first_page} FROM %(after)s"
+            params = {'schema': settings.snowflake_schema, 'after': names[-1]}
+    
+    def invalidate(self, table: Optional[str] = None):
+        """Forget cached metadata for one table, or for the whole schema."""
+        with self._cache_lock:
+            if table is None:
+                self._table_list_cache = None
+                self._schema_cache.clear()
+            else:
+                self._schema_cache.pop(table, None)
     
     def validate_query_safety(self, query: str) -> bool:
         """
         Validate that a query is safe to execute.
         Returns True if safe, False otherwise.
         """
-        query_upper = query.strip().upper()
-        
-        # Must be a SELECT query
-        if not query_upper.startswith('SELECT'):
-            return False
-        
-        # Check for dangerous operations
-        dangerous_patterns = [
-            'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 
-            'ALTER', 'TRUNCATE', 'MERGE', 'CALL', 'EXECUTE'
-        ]
-        
-        for pattern in dangerous_patterns:
-            if pattern in query_upper:
-                return False
-        
-        return True
+        return _query_violation(query) is None
 
 
 # Singleton instance
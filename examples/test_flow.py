@@ -10,10 +10,22 @@ This script demonstrates all major features including:
 
 import asyncio
 import aiohttp
-import json
 from datetime import datetime
 import websockets
 
+try:
+    import orjson
+
+    def json_dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    json_loads = orjson.loads
+except ImportError:
+    # orjson is a server dependency; the example also runs without it
+    import json
+    json_dumps = json.dumps
+    json_loads = json.loads
+
 # Server configuration
 BASE_URL = "http://localhost:8000"
 WS_URL = "ws://localhost:8000"
@@ -29,7 +41,10 @@ class ChatServerTester:
         
     async def setup(self):
         """Initialize HTTP session"""
-        self.session = aiohttp.ClientSession()
+        # One pooled connector so concurrent steps reuse keep-alive connections
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60)
+        )
         
     async def cleanup(self):
         """Close HTTP session"""
@@ -144,7 +159,7 @@ class ChatServerTester:
         }
         
         async with self.session.post(url, headers=headers, json=data) as resp:
-            if resp.status == 200:
+            if resp.status == 202:
                 result = await resp.json()
                 print(f"✓ Submitted LLM query: {query[:50]}...")
                 return result
@@ -153,6 +168,12 @@ class ChatServerTester:
                 print(f"✗ Failed to submit query: {error}")
                 return None
     
+    async def _pinger(self, websocket, interval=20):
+        """Send application pings while the listener waits"""
+        while True:
+            await asyncio.sleep(interval)
+            await websocket.send(json_dumps({"type": "ping"}))
+    
     async def websocket_listener(self, token, duration=10):
         """Connect to WebSocket and listen for messages"""
         uri = f"{WS_URL}/ws/{token}"
@@ -161,27 +182,28 @@ class ChatServerTester:
             async with websockets.connect(uri) as websocket:
                 print(f"✓ Connected to WebSocket")
                 
-                # Set up timeout
-                end_time = asyncio.get_event_loop().time() + duration
+                # Keep-alive runs on its own; the loop below only wakes for messages
+                ping_task = asyncio.create_task(self._pinger(websocket))
+                loop = asyncio.get_running_loop()
+                end_time = loop.time() + duration
                 
-                while asyncio.get_event_loop().time() < end_time:
-                    try:
-                        message = await asyncio.wait_for(
-                            websocket.recv(), 
-                            timeout=1.0
-                        )
-                        data = json.loads(message)
+                try:
+                    while (remaining := end_time - loop.time()) > 0:
+                        try:
+                            message = await asyncio.wait_for(websocket.recv(), timeout=remaining)
+                        except asyncio.TimeoutError:
+                            break
+                        except Exception as e:
+                            print(f"  ⚠️  WebSocket error: {e}")
+                            break
+                        
+                        data = json_loads(message)
                         print(f"  📨 WebSocket message: {data.get('type', 'unknown')}")
                         
                         if data.get('type') == 'llm_response':
                             print(f"  🤖 LLM Response received in thread")
-                            
-                    except asyncio.TimeoutError:
-                        # Send ping to keep connection alive
-                        await websocket.send(json.dumps({"type": "ping"}))
-                    except Exception as e:
-                        print(f"  ⚠️  WebSocket error: {e}")
-                        break
+                finally:
+                    ping_task.cancel()
                         
         except Exception as e:
             print(f"✗ WebSocket connection failed: {e}")
@@ -195,25 +217,31 @@ class ChatServerTester:
         await self.setup()
         
         try:
+            # Independent requests within a step run concurrently
+            
             # Step 1: Register users
             print("📝 STEP 1: Registering users...")
-            alice = await self.register_user(
-                "alice@example.com", 
-                "alice", 
-                "AlicePass123!",
-                "Alice Smith"
-            )
-            bob = await self.register_user(
-                "bob@example.com",
-                "bob",
-                "BobPass123!",
-                "Bob Jones"
+            alice, bob = await asyncio.gather(
+                self.register_user(
+                    "alice@example.com", 
+                    "alice", 
+                    "AlicePass123!",
+                    "Alice Smith"
+                ),
+                self.register_user(
+                    "bob@example.com",
+                    "bob",
+                    "BobPass123!",
+                    "Bob Jones"
+                )
             )
             
             # Step 2: Login users
             print("\n🔐 STEP 2: Logging in users...")
-            alice_auth = await self.login_user("alice@example.com", "AlicePass123!")
-            bob_auth = await self.login_user("bob@example.com", "BobPass123!")
+            alice_auth, bob_auth = await asyncio.gather(
+                self.login_user("alice@example.com", "AlicePass123!"),
+                self.login_user("bob@example.com", "BobPass123!")
+            )
             
             if not alice_auth or not bob_auth:
                 print("❌ Authentication failed, stopping test")
@@ -224,15 +252,17 @@ class ChatServerTester:
             
             # Step 3: Create channels
             print("\n📺 STEP 3: Creating channels...")
-            general_channel = await self.create_channel(
-                alice_token,
-                "general",
-                "General discussion channel"
-            )
-            data_channel = await self.create_channel(
-                alice_token,
-                "data-analysis",
-                "Data analysis and queries"
+            general_channel, data_channel = await asyncio.gather(
+                self.create_channel(
+                    alice_token,
+                    "general",
+                    "General discussion channel"
+                ),
+                self.create_channel(
+                    alice_token,
+                    "data-analysis",
+                    "Data analysis and queries"
+                )
             )
             
             if not general_channel or not data_channel:
@@ -241,20 +271,22 @@ class ChatServerTester:
             
             # Step 4: Send messages
             print("\n💬 STEP 4: Sending messages...")
-            msg1 = await self.send_message(
-                alice_token,
-                general_channel["id"],
-                "Hello everyone! Welcome to our chat server!"
-            )
-            msg2 = await self.send_message(
-                bob_token,
-                general_channel["id"],
-                "Hi Alice! This is great!"
-            )
-            data_msg = await self.send_message(
-                alice_token,
-                data_channel["id"],
-                "Let's analyze some data using the LLM feature"
+            msg1, msg2, data_msg = await asyncio.gather(
+                self.send_message(
+                    alice_token,
+                    general_channel["id"],
+                    "Hello everyone! Welcome to our chat server!"
+                ),
+                self.send_message(
+                    bob_token,
+                    general_channel["id"],
+                    "Hi Alice! This is great!"
+                ),
+                self.send_message(
+                    alice_token,
+                    data_channel["id"],
+                    "Let's analyze some data using the LLM feature"
+                )
             )
             
             # Step 5: Create thread with LLM
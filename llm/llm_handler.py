@@ -1,8 +1,14 @@
-import openai
+from cachetools import TTLCache
+from openai import AsyncOpenAI
+import asyncio
+import csv
+import hashlib
+import io
 import json
 import re
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+from functools import lru_cache
 import logging
 
 from config.settings import get_settings
@@ -11,33 +17,101 @@ from database.snowflake_connector import snowflake_connector
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-openai.api_key = settings.openai_api_key
+# Bounded so a long response without a terminator cannot be scanned twice
+_SELECT_STATEMENT_RE = re.compile(r'SELECT\s[^;]{0,4096};?', re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def _render_schema_context(
+    tables: Tuple[str, ...],
+    schemas: Tuple[Tuple[str, Tuple[Tuple[str, str, str], ...]], ...]
+) -> str:
+    """Describe tables for the prompt; identical schemas reuse the same string."""
+    columns_by_table = dict(schemas)
+    parts = ["Available tables and their schemas:\n\n"]
+    for table in tables:
+        parts.append(f"Table: {table}\n")
+        if table in columns_by_table:
+            parts.append("Columns:\n")
+            for name, data_type, comment in columns_by_table[table]:
+                parts.append(f"  - {name} ({data_type})")
+                if comment:
+                    parts.append(f" - {comment}")
+                parts.append("\n")
+        parts.append("\n")
+    return "".join(parts)
 
 
 class LLMHandler:
+    # Tables whose schemas are described to the model
+    SCHEMA_CONTEXT_TABLES = 10
+    
     def __init__(self):
         self.model = settings.llm_model
         self.temperature = settings.llm_temperature
         self.max_tokens = settings.llm_max_tokens
+        self._openai = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            timeout=settings.llm_request_timeout_seconds,
+            max_retries=settings.llm_max_retries
+        )
+        # Bounds concurrent Snowflake calls to what the connection pool holds
+        self._snowflake_slots = asyncio.Semaphore(settings.snowflake_pool_size)
+        # Successful answers keyed by prompt and table scope
+        self._response_cache = TTLCache(
+            maxsize=settings.llm_cache_size,
+            ttl=settings.llm_cache_ttl_seconds
+        )
+    
+    @staticmethod
+    def _response_cache_key(user_prompt: str, allowed_tables: Optional[List[str]]) -> str:
+        scope = ",".join(sorted(allowed_tables or []))
+        return hashlib.blake2b(
+            f"{user_prompt.strip().lower()}|{scope}".encode()
+        ).hexdigest()
+    
+    def invalidate(self, table: Optional[str] = None):
+        """Forget cached metadata and the answers that may depend on it."""
+        snowflake_connector.invalidate(table)
+        self._response_cache.clear()
     
     def extract_sql_from_response(self, response: str) -> Optional[str]:
         """Extract SQL query from LLM response."""
-        # Look for SQL in code blocks
-        sql_pattern = r'```sql\n(.*?)\n```'
-        matches = re.findall(sql_pattern, response, re.DOTALL | re.IGNORECASE)
-        
-        if matches:
-            return matches[0].strip()
-        
-        # Look for SELECT statements
-        select_pattern = r'(SELECT\s+.*?(?:;|$))'
-        matches = re.findall(select_pattern, response, re.DOTALL | re.IGNORECASE)
+        # Look for SQL in the first ```sql code block
+        fence = response.lower().find('```sql')
+        if fence != -1:
+            body_start = response.find('\n', fence) + 1
+            body_end = response.find('```', body_start) if body_start else -1
+            if body_end != -1:
+                return response[body_start:body_end].strip()
         
-        if matches:
-            return matches[0].strip()
+        # Look for a SELECT statement
+        match = _SELECT_STATEMENT_RE.search(response)
+        if match:
+            return match.group(0).strip()
         
         return None
     
+    async def _snowflake(self, func, *args, **kwargs):
+        """Run a blocking connector call in a worker thread."""
+        async with self._snowflake_slots:
+            return await asyncio.to_thread(func, *args, **kwargs)
+    
+    async def warm_schemas(self, allowed_tables: Optional[List[str]] = None):
+        """
+        Load the metadata a thread's first query will need into the
+        connector cache, so that query does not pay for it cold.
+        """
+        all_tables = await self._snowflake(snowflake_connector.list_available_tables)
+        if allowed_tables:
+            tables = [t for t in all_tables if t in allowed_tables]
+        else:
+            tables = all_tables
+        await self._snowflake(
+            snowflake_connector.get_tables_schemas,
+            tables[:self.SCHEMA_CONTEXT_TABLES]
+        )
+    
     async def generate_sql_query(
         self,
         user_prompt: str,
@@ -47,17 +121,16 @@ class LLMHandler:
         """Generate SQL query based on user prompt and available tables."""
         
         # Build context about available tables
-        schema_context = "Available tables and their schemas:\n\n"
-        for table in available_tables:
-            schema_context += f"Table: {table}\n"
-            if table in table_schemas:
-                schema_context += "Columns:\n"
-                for col in table_schemas[table]:
-                    schema_context += f"  - {col['COLUMN_NAME']} ({col['DATA_TYPE']})"
-                    if col.get('COMMENT'):
-                        schema_context += f" - {col['COMMENT']}"
-                    schema_context += "\n"
-            schema_context += "\n"
+        schema_context = _render_schema_context(
+            tuple(available_tables),
+            tuple(
+                (table, tuple(
+                    (col['COLUMN_NAME'], col['DATA_TYPE'], col.get('COMMENT') or '')
+                    for col in columns
+                ))
+                for table, columns in sorted(table_schemas.items())
+            )
+        )
         
         system_prompt = """You are a SQL query assistant for Snowflake databases.
 Your role is to help users query data by generating safe, read-only SQL queries.
@@ -77,7 +150,7 @@ When providing a SQL query, always wrap it in ```sql``` code blocks."""
         ]
         
         try:
-            response = await openai.ChatCompletion.acreate(
+            response = await self._openai.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=self.temperature,
@@ -114,8 +187,16 @@ When providing a SQL query, always wrap it in ```sql``` code blocks."""
         Generates SQL, executes it, and returns formatted results.
         """
         
+        # Only a deterministic model gives the same answer to the same question
+        cacheable = self.temperature == 0
+        if cacheable:
+            cache_key = self._response_cache_key(user_prompt, allowed_tables)
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         # Get available tables
-        all_tables = snowflake_connector.list_available_tables()
+        all_tables = await self._snowflake(snowflake_connector.list_available_tables)
         
         # Filter to allowed tables if specified
         if allowed_tables:
@@ -130,17 +211,26 @@ When providing a SQL query, always wrap it in ```sql``` code blocks."""
                 "message": "You don't have access to any tables in this context."
             }
         
-        # Get schemas for available tables
-        table_schemas = {}
-        for table in available_tables[:10]:  # Limit to first 10 tables for context
-            try:
-                table_schemas[table] = snowflake_connector.get_table_schema(table)
-            except Exception as e:
-                logger.warning(f"Could not get schema for table {table}: {str(e)}")
+        # Get schemas for available tables. Tables the role cannot describe
+        # are simply absent from the result and are listed by name only
+        schema_tables = available_tables[:self.SCHEMA_CONTEXT_TABLES]
+        try:
+            table_schemas = await self._snowflake(snowflake_connector.get_tables_schemas, schema_tables)
+        except Exception as e:
+            logger.warning(f"Could not get table schemas: {str(e)}")
+            table_schemas = {}
+        
+        # Get a Snowflake session ready while the model writes the query
+        warmup = asyncio.create_task(self._snowflake(snowflake_connector.warmup))
         
         # Generate SQL query
         sql_result = await self.generate_sql_query(user_prompt, available_tables, table_schemas)
         
+        try:
+            await warmup
+        except Exception as e:
+            logger.warning(f"Snowflake warmup failed: {str(e)}")
+        
         if not sql_result["success"] or not sql_result["sql_query"]:
             return {
                 "success": False,
@@ -160,24 +250,30 @@ When providing a SQL query, always wrap it in ```sql``` code blocks."""
         
         # Execute query
         try:
-            query_results = snowflake_connector.execute_read_query(
+            columns, rows = await self._snowflake(
+                snowflake_connector.execute_read_query_rowset,
                 sql_result["sql_query"],
                 limit=100  # Limit results for chat context
             )
             
             # Format results for display
-            formatted_results = self.format_query_results(query_results)
+            formatted_results = self.format_query_results(columns, rows)
             
-            return {
+            result = {
                 "success": True,
                 "sql_query": sql_result["sql_query"],
                 "llm_response": sql_result["response"],
-                "query_results": query_results,
+                "columns": columns,
+                "rows": rows,
                 "formatted_results": formatted_results,
-                "row_count": len(query_results),
+                "row_count": len(rows),
                 "model_used": sql_result["model_used"],
                 "timestamp": datetime.utcnow().isoformat()
             }
+            if cacheable:
+                self._response_cache[cache_key] = result
+            
+            return result
             
         except Exception as e:
             logger.error(f"Error executing query: {str(e)}")
@@ -189,30 +285,24 @@ When providing a SQL query, always wrap it in ```sql``` code blocks."""
                 "message": f"Error executing query: {str(e)}"
             }
     
-    def format_query_results(self, results: List[Dict[str, Any]], max_rows: int = 10) -> str:
+    def format_query_results(self, columns: List[str], rows: List[tuple], max_rows: int = 10) -> str:
         """Format query results for display in chat."""
-        if not results:
+        if not rows:
             return "No results found."
         
-        # Get column names
-        columns = list(results[0].keys())
-        
-        # Create formatted output
-        output = f"Found {len(results)} rows. Showing first {min(len(results), max_rows)}:\n\n"
-        
-        # Add header
-        output += " | ".join(columns) + "\n"
-        output += "-" * (len(" | ".join(columns))) + "\n"
+        output = io.StringIO()
+        output.write(f"Found {len(rows)} rows. Showing first {min(len(rows), max_rows)}:\n\n")
         
-        # Add rows
-        for row in results[:max_rows]:
-            row_values = [str(row.get(col, "")) for col in columns]
-            output += " | ".join(row_values) + "\n"
+        # Pipe-delimited table; the C writer renders and quotes each row in one call
+        writer = csv.writer(output, delimiter="|", lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerow(["-" * max(1, len(column)) for column in columns])
+        writer.writerows(rows[:max_rows])
         
-        if len(results) > max_rows:
-            output += f"\n... and {len(results) - max_rows} more rows"
+        if len(rows) > max_rows:
+            output.write(f"\n... and {len(rows) - max_rows} more rows")
         
-        return output
+        return output.getvalue()
 
 
 # Singleton instance
@@ -0,0 +1,35 @@
+import asyncio
+import logging
+import socket
+
+from config.settings import get_settings
+from services.llm_queue import consume
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+async def supervise(consumer: str):
+    """Restart a consumer that crashes, so it cannot take the others down."""
+    while True:
+        try:
+            await consume(consumer)
+        except Exception:
+            logger.exception(f"LLM consumer {consumer} crashed, restarting")
+            await asyncio.sleep(1)
+
+
+async def main():
+    # Consumer names are stable per host so a restarted worker replays the
+    # jobs it had claimed but not yet acknowledged; jobs stranded under a
+    # name that never returns are claimed by consume() once idle
+    hostname = socket.gethostname()
+    await asyncio.gather(*(
+        supervise(f"{hostname}-{i}")
+        for i in range(settings.llm_worker_concurrency)
+    ))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,15 +1,19 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import uvicorn
-import json
+import orjson
 from typing import Optional
+from uuid import UUID
 
 from config.settings import get_settings
-from core.database import init_db
+from core.cache import redis_client
+from core.database import ReadOnlySessionLocal, engine, init_db, warm_pool
 from core.websocket import manager
 from api import auth, users, channels, messages, threads
-from services.auth import get_current_user_ws
+from services.auth import get_current_user_ws, is_member
 
 settings = get_settings()
 
@@ -18,14 +22,24 @@ settings = get_settings()
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    await warm_pool()
+    await redis_client.ping()
+    app.state.engine = engine
+    app.state.redis = redis_client
+    listener = asyncio.create_task(manager.listen())
     yield
     # Shutdown
-    # Add any cleanup code here
+    listener.cancel()
+    with suppress(asyncio.CancelledError):
+        await listener
+    await redis_client.aclose()
+    await engine.dispose()
 
 
 app = FastAPI(
     title=settings.app_name,
     version=settings.api_version,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -36,6 +50,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Message history pagination
 )
 
 # Include routers
@@ -56,55 +71,98 @@ async def health_check():
     return {"status": "healthy"}
 
 
+def _channel_uuid(data: dict) -> Optional[UUID]:
+    try:
+        return UUID(data.get("channel_id"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+async def _join_channel(data: dict, user_id: str):
+    # Only members are subscribed; this also keeps arbitrary ids out of
+    # the manager's channel table
+    channel_uuid = _channel_uuid(data)
+    allowed = False
+    if channel_uuid is not None:
+        async with ReadOnlySessionLocal() as db:
+            allowed = await is_member(db, UUID(user_id), channel_uuid)
+    if not allowed:
+        await manager.send_personal_message({
+            "type": "channel_join_denied",
+            "channel_id": data.get("channel_id")
+        }, user_id)
+        return
+    
+    channel_id = str(channel_uuid)
+    manager.add_user_to_channel(user_id, channel_id)
+    await manager.send_personal_message({
+        "type": "channel_joined",
+        "channel_id": channel_id
+    }, user_id)
+
+
+async def _leave_channel(data: dict, user_id: str):
+    channel_uuid = _channel_uuid(data)
+    if channel_uuid is not None:
+        manager.remove_user_from_channel(user_id, str(channel_uuid))
+    await manager.send_personal_message({
+        "type": "channel_left",
+        "channel_id": data.get("channel_id")
+    }, user_id)
+
+
+async def _typing(data: dict, user_id: str):
+    channel_id = data.get("channel_id")
+    is_typing = data.get("is_typing", False)
+    await manager.broadcast_typing_indicator(channel_id, user_id, is_typing)
+
+
+async def _pong(data: dict, user_id: str):
+    await manager.send_personal_message({"type": "pong"}, user_id)
+
+
+async def _ignore(data: dict, user_id: str):
+    pass
+
+
+# Client frame handlers by message type
+_HANDLERS = {
+    "join_channel": _join_channel,
+    "leave_channel": _leave_channel,
+    "typing": _typing,
+    "ping": _pong,
+}
+
+
 @app.websocket("/ws/{token}")
-async def websocket_endpoint(websocket: WebSocket, token: str):
+async def websocket_endpoint(websocket: WebSocket, token: str, batch: bool = False):
     user = await get_current_user_ws(token)
     if not user:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
     
     user_id = str(user.id)
-    await manager.connect(websocket, user_id)
+    await manager.connect(websocket, user_id, batched=batch)
     await manager.notify_user_status(user_id, "online")
     
     try:
         while True:
-            data = await websocket.receive_json()
-            message_type = data.get("type")
-            
-            if message_type == "join_channel":
-                channel_id = data.get("channel_id")
-                manager.add_user_to_channel(user_id, channel_id)
-                await manager.send_personal_message({
-                    "type": "channel_joined",
-                    "channel_id": channel_id
-                }, user_id)
-                
-            elif message_type == "leave_channel":
-                channel_id = data.get("channel_id")
-                manager.remove_user_from_channel(user_id, channel_id)
-                await manager.send_personal_message({
-                    "type": "channel_left",
-                    "channel_id": channel_id
-                }, user_id)
-                
-            elif message_type == "typing":
-                channel_id = data.get("channel_id")
-                is_typing = data.get("is_typing", False)
-                await manager.broadcast_typing_indicator(channel_id, user_id, is_typing)
-                
-            elif message_type == "ping":
-                await manager.send_personal_message({"type": "pong"}, user_id)
+            data = orjson.loads(await websocket.receive_text())
+            await _HANDLERS.get(data.get("type"), _ignore)(data, user_id)
                 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        manager.disconnect(user_id, websocket)
         await manager.notify_user_status(user_id, "offline")
 
 
 if __name__ == "__main__":
+    # The uvicorn CLI does not read these; see README for the matching flags
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=settings.port,
-        reload=settings.debug
+        reload=settings.debug,
+        ws_per_message_deflate=settings.websocket_per_message_deflate,
+        ws_ping_interval=settings.websocket_ping_interval_seconds,
+        ws_ping_timeout=settings.websocket_ping_timeout_seconds
     )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from .base import Base, BaseModel
+from .base import Base, BaseModel, uuid7
 from .user import User
 from .channel import Channel, ChannelMember
 from .message import Message, Thread
@@ -10,5 +10,6 @@ __all__ = [
     "Channel",
     "ChannelMember",
     "Message",
-    "Thread"
+    "Thread",
+    "uuid7"
 ]
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, Text, ForeignKey, Integer
+from sqlalchemy import Column, String, Boolean, Text, ForeignKey, Integer, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from .base import BaseModel
@@ -16,15 +16,19 @@ class Channel(BaseModel):
     
     # Relationships
     owner = relationship("User", back_populates="owned_channels")
-    messages = relationship("Message", back_populates="channel", cascade="all, delete-orphan")
-    members = relationship("ChannelMember", back_populates="channel", cascade="all, delete-orphan")
+    messages = relationship("Message", back_populates="channel", cascade="all", passive_deletes=True)
+    members = relationship("ChannelMember", back_populates="channel", cascade="all", passive_deletes=True)
 
 
 class ChannelMember(BaseModel):
     __tablename__ = "channel_members"
+    __table_args__ = (
+        # Backs every (channel_id, user_id) membership lookup
+        Index("ix_chanmem_chan_user", "channel_id", "user_id", unique=True),
+    )
     
-    channel_id = Column(UUID(as_uuid=True), ForeignKey("channels.id"), nullable=False)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    channel_id = Column(UUID(as_uuid=True), ForeignKey("channels.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(50), default="member")  # owner, admin, member
     last_read_message_id = Column(UUID(as_uuid=True), ForeignKey("messages.id"))
     notification_level = Column(String(50), default="all")  # all, mentions, none
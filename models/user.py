@@ -1,8 +1,11 @@
-from sqlalchemy import Column, String, Boolean, Text
+from sqlalchemy import Column, String, Boolean, Text, Index, Enum, func
 from sqlalchemy.orm import relationship
 from .base import BaseModel
 
 
+UserStatus = Enum("online", "offline", "away", "busy", name="user_status")
+
+
 class User(BaseModel):
     __tablename__ = "users"
     
@@ -13,9 +16,14 @@ class User(BaseModel):
     is_active = Column(Boolean, default=True)
     is_superuser = Column(Boolean, default=False)
     avatar_url = Column(Text)
-    status = Column(String(50), default="offline")  # online, offline, away, busy
+    status = Column(UserStatus, default="offline", nullable=False)
     
     # Relationships
-    messages = relationship("Message", back_populates="author", cascade="all, delete-orphan")
-    channel_memberships = relationship("ChannelMember", back_populates="user", cascade="all, delete-orphan")
-    owned_channels = relationship("Channel", back_populates="owner")
\ No newline at end of file
+    # Postgres deletes a user's messages (ON DELETE CASCADE); the ORM never loads them for it
+    messages = relationship("Message", back_populates="author", cascade="all", passive_deletes=True)
+    channel_memberships = relationship("ChannelMember", back_populates="user", cascade="all", passive_deletes=True)
+    owned_channels = relationship("Channel", back_populates="owner")
+
+
+# Emails are matched case-insensitively at login and registration
+Index("ix_users_email_lower", func.lower(User.email), unique=True)
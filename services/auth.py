@@ -1,67 +1,277 @@
-from fastapi import Depends, HTTPException, status
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import bindparam, func, select, text
+from pydantic import BaseModel, ConfigDict
+from redis.exceptions import RedisError
 from typing import Optional
+from uuid import UUID
+import asyncio
+import hashlib
+import logging
+import time
 
-from core.database import get_db
-from core.security import decode_token, verify_password
+from config.settings import get_settings
+from core.cache import redis_client
+from core.database import ReadOnlySessionLocal, get_db_ro
+from core.security import decode_token, get_password_hash, verify_password
 from models import User
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class BearerToken(OAuth2PasswordBearer):
+    """
+    OAuth2PasswordBearer that slices the token straight off the header.
+    Subclassed rather than replaced so the OpenAPI security scheme stays.
+    """
+    async def __call__(self, request: Request) -> str:
+        authorization = request.headers.get("authorization")
+        if not authorization or authorization[:7].lower() != "bearer ":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return authorization[7:]
+
+
+oauth2_scheme = BearerToken(tokenUrl="token", scheme_name="OAuth2PasswordBearer")
+
+# Verified payloads by SHA-256 of the token; the raw token is never stored
+_payload_cache = TTLCache(
+    maxsize=settings.token_cache_size,
+    ttl=settings.token_cache_ttl_seconds
+)
+
+
+def _cached_decode(token: str) -> Optional[dict]:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _payload_cache.get(key)
+    if payload is None:
+        payload = decode_token(token)
+        # Only cache tokens that stay unexpired for the whole TTL
+        if payload is not None and payload.get("exp", 0) - time.time() > _payload_cache.ttl:
+            _payload_cache[key] = payload
+    return payload
+
+
+class CurrentUser(BaseModel):
+    """Snapshot of the authenticated user, cached in Redis between requests."""
+    id: UUID
+    email: str
+    username: str
+    full_name: Optional[str] = None
+    avatar_url: Optional[str] = None
+    status: Optional[str] = None
+    is_active: bool = True
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# In-process layer over the Redis session cache. Other processes drop
+# their copy only when it expires, so the TTL bounds how stale it can be
+_user_cache = TTLCache(
+    maxsize=settings.user_cache_size,
+    ttl=settings.user_cache_ttl_seconds
+)
+
+
+def _session_key(user_id: str) -> str:
+    return f"sess:{user_id}"
+
+
+async def _load_current_user(user_id: str, db: AsyncSession) -> Optional[CurrentUser]:
+    current_user = _user_cache.get(user_id)
+    if current_user is not None:
+        return current_user
+    
+    current_user = await _load_session(user_id, db)
+    if current_user is not None:
+        _user_cache[user_id] = current_user
+    return current_user
+
+
+async def _load_session(user_id: str, db: AsyncSession) -> Optional[CurrentUser]:
+    key = _session_key(user_id)
+    try:
+        cached = await redis_client.get(key)
+    except RedisError as e:
+        logger.warning(f"Session cache unavailable: {str(e)}")
+        cached = None
+
+    if cached is not None:
+        return CurrentUser.model_validate_json(cached)
+
+    try:
+        user_uuid = UUID(user_id)
+    except ValueError:
+        return None
+    # Primary-key lookup: identity map first, no statement to build
+    user = await db.get(User, user_uuid)
+    if user is None:
+        return None
+
+    current_user = CurrentUser.model_validate(user)
+    try:
+        await redis_client.set(
+            key,
+            current_user.model_dump_json(),
+            ex=settings.access_token_expire_minutes * 60
+        )
+    except RedisError as e:
+        logger.warning(f"Session cache unavailable: {str(e)}")
+
+    return current_user
+
+
+async def invalidate_user_session(user_id: str):
+    _user_cache.pop(str(user_id), None)
+    try:
+        await redis_client.delete(_session_key(user_id))
+    except RedisError as e:
+        logger.warning(f"Session cache unavailable: {str(e)}")
 
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db_ro)
+) -> CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    payload = decode_token(token)
+
+    payload = _cached_decode(token)
     if payload is None:
         raise credentials_exception
-    
+
     user_id: str = payload.get("sub")
     if user_id is None:
         raise credentials_exception
-    
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    
+
+    user = await _load_current_user(user_id, db)
+
     if user is None:
         raise credentials_exception
-    
+
     return user
 
 
-async def get_current_user_ws(token: str) -> Optional[User]:
-    from core.database import AsyncSessionLocal
-    
-    payload = decode_token(token)
+class TokenClaims(BaseModel):
+    """Identity carried by a verified access token."""
+    id: UUID
+
+
+async def get_current_user_claims(token: str = Depends(oauth2_scheme)) -> TokenClaims:
+    """
+    Authenticate from the token alone, with no cache or database lookup.
+    For read-only endpoints that only need the caller's id. Endpoints that
+    write rows keyed by the caller use get_current_user, which confirms
+    the user still exists.
+    """
+    payload = _cached_decode(token)
+    try:
+        return TokenClaims(id=payload["sub"])
+    except (TypeError, KeyError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+async def get_current_user_ws(token: str) -> Optional[CurrentUser]:
+    """
+    Resolve a WebSocket token to a user. A database session is opened
+    only on a cache miss.
+    """
+    payload = _cached_decode(token)
     if payload is None:
         return None
-    
+
     user_id: str = payload.get("sub")
     if user_id is None:
         return None
-    
-    async with AsyncSessionLocal() as db:
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        return user
+
+    current_user = _user_cache.get(user_id)
+    if current_user is not None:
+        return current_user
+
+    async with ReadOnlySessionLocal() as session:
+        return await _load_current_user(user_id, session)
+
+
+# Constant SQL outside the ORM: SQLAlchemy's compiled cache and asyncpg's
+# per-connection prepared statement cache both hit, so the server only
+# binds and executes it
+_MEMBER_ROLE = text(
+    "SELECT role FROM channel_members "
+    "WHERE channel_id = :channel_id AND user_id = :user_id LIMIT 1"
+)
+
+
+def _membership_key(user_id, channel_id) -> str:
+    return f"mem:{channel_id}:{user_id}"
+
+
+async def is_member(db: AsyncSession, user_id: UUID, channel_id: UUID) -> bool:
+    """
+    Check channel membership through a Redis cache of (user, channel) -> role.
+    Non-members are cached as an empty role with a shorter TTL.
+    """
+    key = _membership_key(user_id, channel_id)
+    try:
+        cached = await redis_client.get(key)
+    except RedisError as e:
+        logger.warning(f"Membership cache unavailable: {str(e)}")
+        cached = None
+
+    if cached is not None:
+        return cached != ""
+
+    result = await db.execute(_MEMBER_ROLE, {"channel_id": channel_id, "user_id": user_id})
+    role = result.scalar_one_or_none()
+
+    try:
+        if role is not None:
+            await redis_client.set(key, role, ex=settings.membership_cache_ttl_seconds)
+        else:
+            await redis_client.set(key, "", ex=settings.membership_negative_ttl_seconds)
+    except RedisError as e:
+        logger.warning(f"Membership cache unavailable: {str(e)}")
+
+    return role is not None
+
+
+async def cache_membership(user_id: UUID, channel_id: UUID, role: str):
+    try:
+        await redis_client.set(
+            _membership_key(user_id, channel_id),
+            role,
+            ex=settings.membership_cache_ttl_seconds
+        )
+    except RedisError as e:
+        logger.warning(f"Membership cache unavailable: {str(e)}")
+
+
+# Built once; each login only binds the email
+_USER_BY_EMAIL = select(User).where(func.lower(User.email) == bindparam("email"))
+
+# Verified against when the email is unknown, so a failed login takes
+# the same time whether or not the account exists
+_DUMMY_HASH = get_password_hash("not-a-password")
 
 
 async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        return None
-    if not verify_password(password, user.hashed_password):
-        return None
-    
-    return user
\ No newline at end of file
+    user = await db.scalar(_USER_BY_EMAIL, {"email": email.lower()})
+    hashed_password = user.hashed_password if user else _DUMMY_HASH
+
+    # Verify off the event loop; password hashing is CPU-bound
+    verified = await asyncio.get_running_loop().run_in_executor(
+        None, verify_password, password, hashed_password
+    )
+
+    return user if user and verified else None
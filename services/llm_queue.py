@@ -0,0 +1,227 @@
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import insert
+from typing import List, Optional, Dict, Any
+from uuid import UUID
+import asyncio
+import logging
+import orjson
+import time
+
+from config.settings import get_settings
+from core.cache import redis_client
+from core.database import engine
+from core.websocket import manager
+from llm.llm_handler import llm_handler
+from models import Message
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+LLM_STREAM = "llm:queue"
+LLM_GROUP = "llm-workers"
+
+# Jobs are cut off before another consumer could claim them and run them
+# a second time; the margin covers the ack that follows
+JOB_TIMEOUT_SECONDS = settings.llm_queue_claim_idle_seconds * 0.8
+
+
+async def enqueue_llm_query(
+    thread_id: str,
+    channel_id: str,
+    user_query: str,
+    allowed_tables: Optional[List[str]],
+    context: Optional[Dict[str, Any]]
+) -> str:
+    """Append an LLM query job to the Redis stream consumed by llm_worker.py."""
+    job = {
+        "thread_id": thread_id,
+        "channel_id": channel_id,
+        "user_query": user_query,
+        "allowed_tables": allowed_tables,
+        "context": context
+    }
+    return await redis_client.xadd(
+        LLM_STREAM,
+        {"job": orjson.dumps(job)},
+        maxlen=settings.llm_queue_maxlen,
+        approximate=True
+    )
+
+
+async def enqueue_schema_warmup(allowed_tables: Optional[List[str]]):
+    """Ask a worker to prefetch table schemas for a newly created thread."""
+    try:
+        await redis_client.xadd(
+            LLM_STREAM,
+            {"warm": orjson.dumps(allowed_tables)},
+            maxlen=settings.llm_queue_maxlen,
+            approximate=True
+        )
+    except RedisError as e:
+        # Only an optimisation; the first query fetches the schemas itself
+        logger.warning(f"Could not queue schema warmup: {str(e)}")
+
+
+async def process_llm_query_task(
+    thread_id: str,
+    channel_id: str,
+    user_query: str,
+    allowed_tables: Optional[List[str]],
+    context: Optional[Dict[str, Any]]
+):
+    """Process an LLM query and send results via WebSocket."""
+
+    # Process the data request
+    result = await llm_handler.process_data_request(
+        user_prompt=user_query,
+        allowed_tables=allowed_tables,
+        enterprise_context=context
+    )
+
+    content = result.get("formatted_results", result.get("message", "Error processing query"))
+    llm_context = {
+        "query": user_query,
+        "sql_query": result.get("sql_query"),
+        "row_count": result.get("row_count"),
+        "success": result.get("success"),
+        "error": result.get("error")
+    }
+
+    # Create LLM response message; a single Core INSERT, no ORM unit of work
+    async with engine.begin() as conn:
+        inserted = await conn.execute(
+            insert(Message)
+            .values(
+                channel_id=UUID(channel_id),
+                author_id=UUID("00000000-0000-0000-0000-000000000000"),  # System user
+                thread_id=UUID(thread_id),
+                content=content,
+                message_type="llm_response",
+                llm_context=llm_context,
+                llm_model_used=result.get("model_used")
+            )
+            .returning(Message.id, Message.created_at)
+        )
+        row = inserted.one()
+
+    # Broadcast via WebSocket
+    await manager.broadcast_to_channel(
+        {
+            "type": "llm_response",
+            "thread_id": thread_id,
+            "message": {
+                "id": row.id,
+                "content": content,
+                "llm_context": llm_context,
+                "created_at": row.created_at
+            }
+        },
+        channel_id
+    )
+
+
+async def _ensure_group():
+    try:
+        await redis_client.xgroup_create(LLM_STREAM, LLM_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _claim_stale(consumer: str) -> list:
+    """
+    Take over entries that any consumer read but never acknowledged,
+    e.g. one whose container crashed or was recreated under a new name.
+    """
+    claimed = []
+    start_id = "0-0"
+    while True:
+        response = await redis_client.xautoclaim(
+            LLM_STREAM,
+            LLM_GROUP,
+            consumer,
+            min_idle_time=settings.llm_queue_claim_idle_seconds * 1000,
+            start_id=start_id,
+            count=100
+        )
+        start_id, entries = response[0], response[1]
+        claimed.extend(entries)
+        if start_id == "0-0":
+            return claimed
+
+
+async def _process_entries(entries: list):
+    for entry_id, fields in entries:
+        try:
+            if not fields:
+                # Trimmed from the stream before anyone processed it
+                pass
+            elif "warm" in fields:
+                await asyncio.wait_for(
+                    llm_handler.warm_schemas(orjson.loads(fields["warm"])),
+                    JOB_TIMEOUT_SECONDS
+                )
+            else:
+                await asyncio.wait_for(
+                    process_llm_query_task(**orjson.loads(fields["job"])),
+                    JOB_TIMEOUT_SECONDS
+                )
+        except Exception:
+            logger.exception(f"LLM job {entry_id} failed")
+        await _ack(entry_id)
+
+
+async def _ack(entry_id: str):
+    # Retried until it lands; an entry left pending would be claimed and
+    # processed again once idle
+    while True:
+        try:
+            await redis_client.xack(LLM_STREAM, LLM_GROUP, entry_id)
+            return
+        except RedisError as e:
+            logger.warning(f"Could not acknowledge LLM job {entry_id}, retrying: {str(e)}")
+            await asyncio.sleep(1)
+
+
+async def consume(consumer: str):
+    """
+    Process jobs from the LLM stream as one consumer of the worker group.
+    Entries still pending for this consumer are replayed first, and
+    entries left pending by other consumers are claimed periodically once
+    idle. Every entry is acknowledged once processed, including ones
+    that fail.
+    """
+    while True:
+        try:
+            await _ensure_group()
+            break
+        except RedisError as e:
+            logger.warning(f"LLM queue unavailable, retrying: {str(e)}")
+            await asyncio.sleep(1)
+    last_id = "0"
+    next_claim = 0.0
+
+    while True:
+        if time.monotonic() >= next_claim:
+            try:
+                await _process_entries(await _claim_stale(consumer))
+            except RedisError as e:
+                logger.warning(f"Could not claim stale LLM jobs: {str(e)}")
+            next_claim = time.monotonic() + settings.llm_queue_claim_interval_seconds
+
+        try:
+            response = await redis_client.xreadgroup(
+                LLM_GROUP, consumer, {LLM_STREAM: last_id}, count=1, block=5000
+            )
+        except RedisError as e:
+            logger.warning(f"LLM queue unavailable, retrying: {str(e)}")
+            await asyncio.sleep(1)
+            continue
+
+        entries = response[0][1] if response else []
+        if not entries and last_id == "0":
+            # Pending backlog drained; switch to new entries
+            last_id = ">"
+            continue
+
+        await _process_entries(entries)